@@ -3,55 +3,277 @@ Script to build the FAISS vector index from the crime dataset.
 Run this script whenever you update the crime.csv file or want to rebuild the index.
 """
 
+import math
 import faiss
 import pandas as pd
 import numpy as np
-from embeddings import generate_embeddings
-from config import CSV_FILE, INDEX_FILE
-import pickle
-
-print("📊 Loading crime dataset...")
-df = pd.read_csv(CSV_FILE)
-
-print(f"✅ Loaded {len(df)} crime records")
-print(f"📋 Columns: {df.columns.tolist()}")
-
-# Combine columns into one text for better search
-print("\n🔄 Creating combined text for embeddings...")
-df["combined_text"] = df.apply(
-    lambda row: f"DR Number: {row['DR_NO']}, Crime: {row['Crm Cd Desc']}, "
-    f"Location: {row['LOCATION']}, Area: {row['AREA NAME']}, "
-    f"Date Occurred: {row['DATE OCC']}, Time: {row['TIME OCC']}, "
-    f"Victim Age: {row['Vict Age']}, Victim Sex: {row['Vict Sex']}, "
-    f"Premises: {row['Premis Desc']}, Status: {row['Status Desc']}",
-    axis=1,
+import pyarrow as pa
+from embeddings import (
+    get_device,
+    get_model,
+    generate_embeddings,
+    generate_embeddings_parallel,
+    start_cpu_pool,
+    stop_cpu_pool,
 )
+from vector_store import get_gpu_resources
+from config import (
+    CSV_FILE,
+    CSV_CHUNK_SIZE,
+    INDEX_FILE,
+    TEXTS_FILE,
+    INDEX_TYPE,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    PQ_M,
+    PQ_NBITS,
+    OPQ_DIM,
+    SQ_BITS,
+    TRAIN_SIZE,
+    FAISS_USE_GPU,
+)
+
+# (label, column) pairs that make up the combined text of each record
+TEXT_FIELDS = [
+    ("DR Number", "DR_NO"),
+    ("Crime", "Crm Cd Desc"),
+    ("Location", "LOCATION"),
+    ("Area", "AREA NAME"),
+    ("Date Occurred", "DATE OCC"),
+    ("Time", "TIME OCC"),
+    ("Victim Age", "Vict Age"),
+    ("Victim Sex", "Vict Sex"),
+    ("Premises", "Premis Desc"),
+    ("Status", "Status Desc"),
+]
+
+
+def build_combined_text(df):
+    """
+    Combine the record columns into one searchable text per row.
+
+    Uses vectorized column-wise string concatenation instead of a per-row
+    Python lambda.
+    """
+    combined = None
+    for label, column in TEXT_FIELDS:
+        prefix = f"{label}: " if combined is None else f", {label}: "
+        # Missing values render as "nan", as they would in an f-string
+        part = prefix + df[column].fillna("nan").astype(str)
+        combined = part if combined is None else combined + part
+    return combined
+
+
+def ivf_nlist(num_vectors):
+    """Number of IVF lists for a corpus of `num_vectors` (4 * sqrt(N))."""
+    return max(1, int(4 * math.sqrt(num_vectors)))
+
+
+def count_rows():
+    """Count the CSV records with a cheap single-column pass."""
+    first_column = TEXT_FIELDS[0][1]
+    chunks = pd.read_csv(CSV_FILE, usecols=[first_column], chunksize=CSV_CHUNK_SIZE)
+    return sum(len(chunk) for chunk in chunks)
+
+
+def iter_text_chunks():
+    """Stream the CSV in chunks of CSV_CHUNK_SIZE rows, yielding their texts."""
+    columns = [column for _, column in TEXT_FIELDS]
+    chunks = pd.read_csv(CSV_FILE, usecols=columns, dtype=str, chunksize=CSV_CHUNK_SIZE)
+    for chunk in chunks:
+        yield build_combined_text(chunk).tolist()
+
+
+def create_index(dimension, num_vectors):
+    """
+    Create the (empty) FAISS index selected by INDEX_TYPE.
+
+    IVF and scalar-quantized indexes need training before vectors can be
+    added; `num_vectors` is the final corpus size used to size the IVF
+    inverted lists.
+
+    All index types use inner-product search over L2-normalized vectors,
+    which ranks exactly like cosine similarity.
+
+    - 'hnsw': graph-based approximate search, sub-linear per query
+    - 'hnswsq': HNSW over SQ_BITS scalar-quantized vectors (4-8x smaller)
+    - 'ivfflat': inverted lists over full vectors, scans ~nprobe/nlist of them
+    - 'ivfpq': inverted lists over product-quantized vectors (~16x smaller)
+    - 'opq_ivfpq': IVFPQ behind a learned OPQ rotation to OPQ_DIM dimensions,
+      for better recall at the same code size
+    - 'ivfsq8': inverted lists over 8-bit scalar-quantized vectors (4x smaller)
+    - 'flat': exact brute-force scan
+    - 'flat_fp16': exact scan over float16 vectors (half the memory traffic)
+    """
+    if INDEX_TYPE == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+
+    elif INDEX_TYPE == "hnswsq":
+        qtype = {8: faiss.ScalarQuantizer.QT_8bit, 4: faiss.ScalarQuantizer.QT_4bit}
+        index = faiss.IndexHNSWSQ(
+            dimension, qtype[SQ_BITS], HNSW_M, faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+
+    elif INDEX_TYPE == "ivfflat":
+        nlist = ivf_nlist(num_vectors)
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFFlat(
+            quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT
+        )
+
+    elif INDEX_TYPE == "ivfpq":
+        nlist = ivf_nlist(num_vectors)
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQ(
+            quantizer,
+            dimension,
+            nlist,
+            PQ_M,
+            PQ_NBITS,
+            faiss.METRIC_INNER_PRODUCT,
+        )
+
+    elif INDEX_TYPE == "opq_ivfpq":
+        nlist = ivf_nlist(num_vectors)
+        index = faiss.index_factory(
+            dimension,
+            f"OPQ{PQ_M}_{OPQ_DIM},IVF{nlist},PQ{PQ_M}x{PQ_NBITS}",
+            faiss.METRIC_INNER_PRODUCT,
+        )
+
+    elif INDEX_TYPE == "ivfsq8":
+        nlist = ivf_nlist(num_vectors)
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFScalarQuantizer(
+            quantizer,
+            dimension,
+            nlist,
+            faiss.ScalarQuantizer.QT_8bit,
+            faiss.METRIC_INNER_PRODUCT,
+        )
+
+    elif INDEX_TYPE == "flat":
+        index = faiss.IndexFlatIP(dimension)
+
+    elif INDEX_TYPE == "flat_fp16":
+        index = faiss.IndexScalarQuantizer(
+            dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+        )
+
+    else:
+        raise ValueError(f"Unknown INDEX_TYPE: {INDEX_TYPE}")
+
+    return index
+
+
+def move_build_index_to_gpu(index):
+    """
+    Clone the empty index onto GPU 0 so training and adding run there.
+
+    Vectors keep full float32 precision, since the index is copied back
+    to the CPU before it is written. Index types without a GPU
+    implementation (e.g. HNSW) are built on the CPU.
+
+    Returns:
+        (index, on_gpu) tuple
+    """
+    if (
+        not FAISS_USE_GPU
+        or not hasattr(faiss, "StandardGpuResources")
+        or faiss.get_num_gpus() == 0
+    ):
+        return index, False
+
+    try:
+        gpu_index = faiss.index_cpu_to_gpu(get_gpu_resources(), 0, index)
+        print("🚀 Building the index on the GPU")
+        return gpu_index, True
+    except RuntimeError:
+        print(f"ℹ️  {INDEX_TYPE} has no GPU implementation, building on CPU")
+        return index, False
+
+
+def train_and_add(index, buffered):
+    """Train the index on the buffered embeddings (if needed) and add them."""
+    embeddings = np.concatenate(buffered)
+    if not index.is_trained:
+        print(f"🎯 Training {INDEX_TYPE} index on {len(embeddings)} vectors...")
+        index.train(embeddings)
+    index.add(embeddings)
+
+
+def main():
+    print("📊 Scanning crime dataset...")
+    num_rows = count_rows()
+    print(f"✅ Found {num_rows} crime records")
+
+    # Stream the CSV chunk by chunk: build the texts, embed them and add
+    # them to the index, so peak memory stays O(chunk) instead of O(N).
+    print(f"\n🧠 Embedding and indexing in chunks of {CSV_CHUNK_SIZE} records...")
+    print("⏳ This may take a while for large datasets...")
+    print(f"🔨 Building FAISS index ({INDEX_TYPE})...")
+
+    dimension = get_model().get_sentence_embedding_dimension()
+    index, on_gpu = move_build_index_to_gpu(create_index(dimension, num_rows))
+
+    # Indexes that need training are trained on the first TRAIN_SIZE
+    # vectors, which are buffered until then; the others are filled directly.
+    train_size = min(num_rows, TRAIN_SIZE)
+    pending = []
+
+    # No GPU: fan the encoding out across all CPU cores
+    pool = start_cpu_pool() if get_device() != "cuda" else None
+    schema = pa.schema([("text", pa.string())])
+
+    try:
+        # Texts go to an uncompressed Arrow IPC (Feather v2) file so they
+        # can be memory-mapped at query time
+        with pa.OSFile(TEXTS_FILE, "wb") as sink, pa.ipc.new_file(
+            sink, schema
+        ) as writer:
+            for texts in iter_text_chunks():
+                writer.write_batch(pa.record_batch([pa.array(texts)], schema=schema))
+
+                # Unit-length vectors make inner product equal to cosine.
+                # On the GPU the model normalizes before copying to host.
+                if pool is not None:
+                    embeddings = generate_embeddings_parallel(texts, pool=pool)
+                    faiss.normalize_L2(embeddings)
+                else:
+                    embeddings = generate_embeddings(texts, normalize=True)
+
+                if index.is_trained:
+                    index.add(embeddings)
+                    continue
 
-texts = df["combined_text"].tolist()
+                pending.append(embeddings)
+                if sum(len(e) for e in pending) >= train_size:
+                    train_and_add(index, pending)
+                    pending = []
 
-print(f"\n🧠 Generating embeddings for {len(texts)} records...")
-print("⏳ This may take a while for large datasets...")
-embeddings = generate_embeddings(texts)
+            if pending:
+                train_and_add(index, pending)
+    finally:
+        if pool is not None:
+            stop_cpu_pool(pool)
 
-print(f"✅ Generated embeddings with shape: {embeddings.shape}")
+    print(f"✅ Index created with {index.ntotal} vectors")
 
-# Create FAISS index
-print("\n🔨 Building FAISS index...")
-dimension = embeddings.shape[1]
-index = faiss.IndexFlatL2(dimension)
-index.add(embeddings)
+    if on_gpu:
+        index = faiss.index_gpu_to_cpu(index)
 
-print(f"✅ Index created with {index.ntotal} vectors")
+    # Save the index
+    print(f"\n💾 Saving index to {INDEX_FILE}...")
+    faiss.write_index(index, INDEX_FILE)
 
-# Save the index
-print(f"\n💾 Saving index to {INDEX_FILE}...")
-faiss.write_index(index, INDEX_FILE)
+    print("\n✨ Vector store created successfully!")
+    print(f"📍 Index file: {INDEX_FILE}")
+    print(f"📍 Texts file: {TEXTS_FILE}")
 
-# Save the texts for retrieval
-print("💾 Saving texts for retrieval...")
-with open("crime_texts.pkl", "wb") as f:
-    pickle.dump(texts, f)
 
-print("\n✨ Vector store created successfully!")
-print(f"📍 Index file: {INDEX_FILE}")
-print(f"📍 Texts file: crime_texts.pkl")
+# The multi-process encoder spawns workers that re-import this module,
+# so the build must only run when executed as a script.
+if __name__ == "__main__":
+    main()
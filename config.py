@@ -1,6 +1,11 @@
+import os
+
 # Crime Dataset Configuration
 CSV_FILE = "crime.csv"
 
+# Rows read, embedded and indexed at a time by build_index.py
+CSV_CHUNK_SIZE = 10000
+
 # Columns to include in the combined text for embeddings
 CRIME_COLUMNS = {
     "dr_no": "DR_NO",
@@ -20,6 +25,7 @@ CRIME_COLUMNS = {
 
 # Embedding Model
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = 128
 
 # Ollama Configuration
 OLLAMA_URL = "http://localhost:11434/api/generate"
@@ -28,5 +34,63 @@ MODEL_NAME = "phi3"
 # FAISS Index
 INDEX_FILE = "crime_index.faiss"
 
+# Record texts, stored uncompressed in Arrow/Feather so they can be mmaped
+TEXTS_FILE = "crime_texts.feather"
+LEGACY_TEXTS_FILE = "crime_texts.pkl"
+
+# Index type: "hnsw" (graph ANN, default), "hnswsq" (HNSW over scalar-
+# quantized vectors, 4-8x smaller file), "ivfflat" (inverted lists over full
+# vectors, scans only nprobe of nlist cells), "ivfpq" (compressed, for very
+# large or memory-constrained corpora), "opq_ivfpq" (IVFPQ after a learned
+# rotation, better recall at the same size), "ivfsq8" (8-bit vectors, 4x less
+# RAM with negligible recall loss), "flat" (exact brute-force scan) or
+# "flat_fp16" (exact scan over float16 vectors, half the memory bandwidth)
+INDEX_TYPE = "hnsw"
+
+# Vectors buffered to train index types that need it (IVF, SQ)
+TRAIN_SIZE = 100000
+
+# HNSW parameters (efSearch can be tuned per deployment via HNSW_EF_SEARCH)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 40
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "16"))
+
+# Scalar quantizer bits for "hnswsq": 8 (384 B/vector) or 4 (192 B/vector)
+SQ_BITS = 8
+
+# IVF parameters (nlist is derived from the corpus size at build time)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+PQ_M = 16
+PQ_NBITS = 8
+# Output dimension of the OPQ rotation for "opq_ivfpq" (multiple of PQ_M)
+OPQ_DIM = 64
+
+# Move the loaded index to the GPU(s) when faiss-gpu finds one (set
+# FAISS_USE_GPU=0 to opt out). GPU indexes support at most 1024 neighbours.
+FAISS_USE_GPU = os.getenv("FAISS_USE_GPU", "1") == "1"
+GPU_MAX_TOP_K = 1024
+
+# With several GPUs, replicate the index on each (default) or shard it
+# across them when it does not fit on one (FAISS_GPU_SHARD=1)
+FAISS_GPU_SHARD = os.getenv("FAISS_GPU_SHARD", "0") == "1"
+
+# OpenMP threads FAISS may use for a batched search (single-query searches
+# run on one thread to skip fork/join overhead)
+FAISS_NUM_THREADS = int(
+    os.getenv("FAISS_NUM_THREADS", max(1, (os.cpu_count() or 1) // 2))
+)
+
+# Run one throwaway search when the API starts (model load, CUDA/OpenMP
+# init, index page faults) so the first user query is not slow
+VECTOR_STORE_WARMUP = os.getenv("VECTOR_STORE_WARMUP", "1") == "1"
+
+# Concurrent searches arriving within this window are batched into one
+# FAISS search. Every search, even a lone one, waits up to the window, so
+# set SEARCH_BATCH_WINDOW_MS=0 to disable batching on low-traffic deployments.
+SEARCH_BATCH_WINDOW_MS = float(os.getenv("SEARCH_BATCH_WINDOW_MS", "5"))
+
 # Redis Cache TTL (in seconds)
 CACHE_TTL = 180  # 3 minutes
+
+# In-process memo for repeated web searches (in seconds)
+WEB_SEARCH_CACHE_TTL = 300  # 5 minutes, same as the web answer TTL
@@ -1,8 +1,11 @@
 import psycopg2
 from psycopg2 import pool
+from psycopg2.extensions import connection as PgConnection
+from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 import os
 import logging
+import threading
 
 # Load environment variables
 load_dotenv()
@@ -18,33 +21,134 @@ DB_CONFIG = {
     "port": int(os.getenv("DB_PORT", 5432)),
 }
 
-# Connection pool for efficient database access
+# Connections for LLM-generated SQL: every transaction on them starts READ
+# ONLY, so an embedded COMMIT cannot open a writable one. Point
+# DB_READONLY_USER at a role with SELECT-only grants to enforce it in the
+# database as well.
+READONLY_DB_CONFIG = {
+    **DB_CONFIG,
+    "user": os.getenv("DB_READONLY_USER", DB_CONFIG["user"]),
+    "password": os.getenv("DB_READONLY_PASSWORD", DB_CONFIG["password"]),
+    "options": "-c default_transaction_read_only=on",
+}
+
+# Connection pool for efficient database access. Requests are served from
+# several threads, so the pool must be thread-safe; ~2 connections per core
+# is where throughput peaks before the database itself contends, but never
+# fewer than 10. Requests beyond the limit wait up to DB_POOL_TIMEOUT
+# seconds for a free connection instead of failing.
 connection_pool = None
+readonly_pool = None
+_pool_lock = threading.Lock()
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 2))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", max(10, 2 * (os.cpu_count() or 1))))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+
+
+class BlockingConnectionPool(pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that waits for a free connection when exhausted."""
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        self._slots = threading.BoundedSemaphore(maxconn)
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=DB_POOL_TIMEOUT):
+            raise pool.PoolError("timed out waiting for a free connection")
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+# Server-side prepared statements: name -> (parameter types, SQL).
+# Each pooled connection prepares a statement lazily, the first time it runs.
+PREPARED_STATEMENTS = {}
+
+
+class PreparingConnection(PgConnection):
+    """Connection that remembers which statements it has prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def register_prepared_statement(name, sql, param_types=()):
+    """
+    Register a statement that execute_prepared() can run by name.
+
+    Postgres then skips parsing and planning on repeat calls.
+    """
+    PREPARED_STATEMENTS[name] = (tuple(param_types), sql)
 
 
-def initialize_pool(minconn=1, maxconn=10):
-    """Initialize the connection pool."""
-    global connection_pool
+def execute_prepared(cursor, name, params=()):
+    """
+    Run a registered prepared statement on the cursor.
+
+    The statement is PREPAREd on the cursor's connection on first use, as
+    part of the caller's transaction, so a failing PREPARE is rolled back
+    and the connection released like any other query error.
+    """
+    conn = cursor.connection
+    if name not in conn.prepared:
+        # The session may still hold it from an earlier, rolled-back checkout
+        cursor.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s;", (name,))
+        if cursor.fetchone() is None:
+            param_types, sql = PREPARED_STATEMENTS[name]
+            types = f"({', '.join(param_types)})" if param_types else ""
+            cursor.execute(f"PREPARE {name}{types} AS {sql};")
+        conn.prepared.add(name)
+
+    if params:
+        placeholders = ", ".join(["%s"] * len(params))
+        cursor.execute(f"EXECUTE {name}({placeholders});", params)
+    else:
+        cursor.execute(f"EXECUTE {name};")
+
+
+def initialize_pool(minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, readonly=False):
+    """Initialize the connection pool (or the read-only one)."""
+    global connection_pool, readonly_pool
     try:
-        connection_pool = psycopg2.pool.SimpleConnectionPool(
-            minconn, maxconn, **DB_CONFIG
+        new_pool = BlockingConnectionPool(
+            minconn,
+            maxconn,
+            connection_factory=PreparingConnection,
+            **(READONLY_DB_CONFIG if readonly else DB_CONFIG),
         )
+        if readonly:
+            readonly_pool = new_pool
+        else:
+            connection_pool = new_pool
         logger.info("✅ Database connection pool initialized successfully")
-        return connection_pool
+        return new_pool
     except Exception as e:
         logger.error(f"❌ Failed to initialize connection pool: {e}")
         raise
 
 
-def get_db_connection():
-    """Get a connection from the pool."""
-    global connection_pool
+def _get_pool(readonly):
+    """Return the read-only or read-write pool, creating it on first use."""
+    if (readonly_pool if readonly else connection_pool) is None:
+        with _pool_lock:
+            if (readonly_pool if readonly else connection_pool) is None:
+                initialize_pool(readonly=readonly)
+    return readonly_pool if readonly else connection_pool
 
-    if connection_pool is None:
-        initialize_pool()
 
+def get_db_connection(readonly=False):
+    """Get a connection from the pool (read-only sessions if `readonly`)."""
     try:
-        conn = connection_pool.getconn()
+        conn = _get_pool(readonly).getconn()
         logger.info("✅ Database connection acquired from pool")
         return conn
     except Exception as e:
@@ -52,49 +156,77 @@ def get_db_connection():
         raise
 
 
-def release_db_connection(conn):
-    """Return a connection to the pool."""
-    global connection_pool
+def release_db_connection(conn, readonly=False):
+    """Return a connection to the pool it came from."""
+    pool_ = readonly_pool if readonly else connection_pool
 
-    if connection_pool is not None and conn is not None:
-        connection_pool.putconn(conn)
+    if pool_ is not None and conn is not None:
+        pool_.putconn(conn)
         logger.info("✅ Database connection returned to pool")
 
 
 def close_all_connections():
-    """Close all connections in the pool."""
-    global connection_pool
-
-    if connection_pool is not None:
-        connection_pool.closeall()
-        logger.info("✅ All database connections closed")
+    """Close all connections in the pools."""
+    for pool_ in (connection_pool, readonly_pool):
+        if pool_ is not None:
+            pool_.closeall()
+    logger.info("✅ All database connections closed")
 
 
 class DatabaseConnection:
-    """Context manager for database connections."""
+    """
+    Context manager for database connections.
 
-    def __init__(self):
+    Pass `cursor_factory=RealDictCursor` to get rows as dicts built by the
+    driver during fetch, and `readonly=True` to use a session whose
+    transactions are all READ ONLY, so Postgres rejects any write.
+    """
+
+    def __init__(self, cursor_factory=None, readonly=False):
         self.conn = None
         self.cursor = None
+        self.cursor_factory = cursor_factory
+        self.readonly = readonly
 
     def __enter__(self):
-        self.conn = get_db_connection()
-        self.cursor = self.conn.cursor()
+        self.conn = get_db_connection(readonly=self.readonly)
+        try:
+            self.cursor = self.conn.cursor(cursor_factory=self.cursor_factory)
+        except Exception:
+            # __exit__ does not run when __enter__ raises, so give the
+            # connection back here instead of leaking it
+            self._rollback_and_release()
+            raise
         return self.cursor
 
+    def _rollback_and_release(self):
+        """Roll back and always return the connection to the pool."""
+        try:
+            self.conn.rollback()
+        finally:
+            # Re-check statements prepared in the aborted transaction on next use
+            self.conn.prepared.clear()
+            if self.cursor:
+                self.cursor.close()
+            release_db_connection(self.conn, self.readonly)
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         if exc_type is not None:
             # Rollback on error
-            self.conn.rollback()
+            self._rollback_and_release()
             logger.error(f"❌ Transaction rolled back due to error: {exc_val}")
-        else:
-            # Commit on success
-            self.conn.commit()
+            return False
 
+        # Commit on success
+        try:
+            self.conn.commit()
+        except Exception:
+            self._rollback_and_release()
+            raise
         if self.cursor:
             self.cursor.close()
 
-        release_db_connection(self.conn)
+        release_db_connection(self.conn, self.readonly)
 
         # Return False to propagate exceptions
         return False
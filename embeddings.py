@@ -1,11 +1,120 @@
-from sentence_transformers import SentenceTransformer
-from config import EMBEDDING_MODEL
+import math
+import os
+from functools import lru_cache
+from config import EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE
 import numpy as np
 
-model = SentenceTransformer(EMBEDDING_MODEL)
+# torch and sentence_transformers are imported lazily by the loaders below,
+# so importing this module (e.g. in spawned pool workers or at API boot)
+# does not pay for loading the model.
 
 
-def generate_embeddings(texts):
-    """Generate embeddings for a list of texts."""
-    embeddings = model.encode(texts)
-    return np.array(embeddings, dtype="float32")
+@lru_cache(maxsize=1)
+def get_device():
+    """Use the GPU when available, otherwise the CPU."""
+    import torch
+
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+@lru_cache(maxsize=1)
+def get_model():
+    """Load the SentenceTransformer model once, on first use."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    device = get_device()
+    if device == "cpu":
+        # Make sure every CPU core is used (override with
+        # EMBEDDING_NUM_THREADS). Pool workers never call get_model(); they
+        # unpickle the model and are sized by OMP_NUM_THREADS instead.
+        torch.set_num_threads(int(os.getenv("EMBEDDING_NUM_THREADS", os.cpu_count())))
+
+    model = SentenceTransformer(EMBEDDING_MODEL, device=device)
+    if device == "cuda":
+        # FP16 halves activation bandwidth and runs on tensor cores
+        model.half()
+    return model
+
+
+# torch reads OMP_NUM_THREADS at startup to size its intra-op thread pool
+_WORKER_THREAD_ENV = {"OMP_NUM_THREADS": "2"}
+
+
+def generate_embeddings(
+    texts, batch_size=EMBEDDING_BATCH_SIZE, show_progress_bar=None, normalize=False
+):
+    """
+    Generate embeddings for a list of texts in batches of `batch_size`.
+
+    With `normalize=True` the vectors are L2-normalized by the model, on
+    the device they were computed on. Returns a C-contiguous float32
+    (n, d) array, ready for FAISS.
+    """
+    if show_progress_bar is None:
+        # Only show progress for bulk encoding, not single queries
+        show_progress_bar = len(texts) > batch_size
+
+    embeddings = get_model().encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=normalize,
+        show_progress_bar=show_progress_bar,
+        device=get_device(),
+    )
+    # FAISS only accepts C-contiguous float32 (even when the model runs in
+    # FP16) and copies anything else on every call
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def start_cpu_pool(num_processes=None):
+    """
+    Start a pool of CPU worker processes for generate_embeddings_parallel.
+
+    Stop it with stop_cpu_pool(pool) when done.
+    """
+    num_processes = num_processes or os.cpu_count()
+
+    # Each worker gets 2 torch threads to avoid oversubscribing the cores.
+    # Workers are spawned, so they pick these up from the environment.
+    saved_env = {k: os.environ.get(k) for k in _WORKER_THREAD_ENV}
+    os.environ.update(_WORKER_THREAD_ENV)
+    try:
+        return get_model().start_multi_process_pool(["cpu"] * num_processes)
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def stop_cpu_pool(pool):
+    """Stop a pool started with start_cpu_pool()."""
+    get_model().stop_multi_process_pool(pool)
+
+
+def generate_embeddings_parallel(texts, pool=None, num_processes=None, batch_size=64):
+    """
+    Generate embeddings using a pool of CPU worker processes.
+
+    Intended for building the index on machines without a GPU, where a
+    single process leaves most cores idle. Pass a `pool` from
+    start_cpu_pool() to reuse the workers across calls; otherwise a pool
+    is started and stopped for this call only.
+    """
+    own_pool = pool is None
+    if own_pool:
+        pool = start_cpu_pool(num_processes)
+
+    try:
+        chunk_size = min(math.ceil(len(texts) / len(pool["processes"]) / 10), 5000)
+        embeddings = get_model().encode_multi_process(
+            texts, pool, batch_size=batch_size, chunk_size=max(chunk_size, 1)
+        )
+    finally:
+        if own_pool:
+            stop_cpu_pool(pool)
+
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
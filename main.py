@@ -1,12 +1,24 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from redis_cache import redis_client
+from redis_cache import get_cached_answer, cache_answer
 from mcp.tool_router import route_question
+from vector_store import warm_up
+from config import VECTOR_STORE_WARMUP
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Hybrid RAG + AI System")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the vector store before serving so the first request is fast
+    if VECTOR_STORE_WARMUP:
+        warm_up()
+    yield
+
+
+app = FastAPI(title="Hybrid RAG + AI System", lifespan=lifespan)
 
 
 @app.get("/ask")
@@ -19,11 +31,12 @@ def ask(question: str):
     - Direct Ollama (for general knowledge)
     """
 
-    # 1️⃣ Check Redis Cache
-    cached = redis_client.get(question)
+    # 1️⃣ Check Redis Cache (a hit skips both classification and routing)
+    cached = get_cached_answer(question)
     if cached:
+        source_type, answer = cached
         logger.info(f"Cache HIT: {question}")
-        return {"source": "redis-cache", "answer": cached, "cached": True}
+        return {"source": source_type, "answer": answer, "cached": True}
 
     # 2️⃣ Route to appropriate source (Web / RAG / General)
     logger.info(f"Processing question: {question}")
@@ -35,7 +48,7 @@ def ask(question: str):
         source_type, 180
     )
 
-    redis_client.setex(question, cache_ttl, answer)
+    cache_answer(question, source_type, answer, cache_ttl)
     logger.info(f"Response from {source_type}, cached for {cache_ttl}s")
 
     return {"source": source_type, "answer": answer, "cached": False}
@@ -1,5 +1,146 @@
 import re
-from datetime import datetime
+from datetime import date
+from functools import lru_cache
+
+# Temporal keywords
+TEMPORAL_KEYWORDS = [
+    "today",
+    "now",
+    "current",
+    "latest",
+    "recent",
+    "yesterday",
+    "this week",
+    "this month",
+    "this year",
+    "trending",
+    "breaking",
+    "live",
+    "real-time",
+]
+
+# Topics that typically need live data
+LIVE_TOPICS = [
+    "news",
+    "weather",
+    "stock",
+    "price",
+    "election",
+    "covid",
+    "pandemic",
+    "sports score",
+    "match result",
+    "currency rate",
+    "exchange rate",
+    "update",
+]
+
+# Future tense (predictions)
+FUTURE_PATTERNS = [
+    r"\bwill\b",
+    r"\bgoing to\b",
+    r"\bforecast\b",
+    r"\bpredict\b",
+    r"\bexpect\b",
+]
+
+# Keywords that indicate student database queries
+STUDENT_KEYWORDS = [
+    "student",
+    "students",
+    "enrollment",
+    "enrolled",
+    "course",
+    "courses",
+    "class",
+    "classes",
+    "grade",
+    "grades",
+    "gpa",
+    "learner",
+    "learners",
+    "pupil",
+    "pupils",
+    "undergraduate",
+    "graduate",
+    "major",
+    "minor",
+]
+
+# Operations on student data
+STUDENT_OPERATIONS = [
+    "add student",
+    "create student",
+    "new student",
+    "register student",
+    "enroll student",
+    "delete student",
+    "remove student",
+    "update student",
+    "modify student",
+    "edit student",
+    "list student",
+    "show student",
+    "find student",
+    "search student",
+    "get student",
+    "how many student",
+    "count student",
+    "average age",
+    "who is enrolled",
+    "who is taking",
+    "who studies",
+]
+
+# Keywords that indicate crime database queries
+DOMAIN_KEYWORDS = [
+    "crime",
+    "criminal",
+    "incident",
+    "offense",
+    "arrest",
+    "robbery",
+    "theft",
+    "assault",
+    "burglary",
+    "homicide",
+    "violation",
+    "suspect",
+    "victim",
+    "report",
+    "police",
+    "investigation",
+    "felony",
+    "misdemeanor",
+    "los angeles",
+    # "la" is too short/generic on its own, better to rely on longer context or specific crime terms
+    # "location", "area", "district" are too generic unless combined with crime terms
+]
+
+
+def _compile_substring_pattern(keywords):
+    """
+    Compile keywords into one alternation that matches any of them as a
+    substring, so each check is a single C-level scan of the question.
+    """
+    return re.compile("|".join(re.escape(keyword) for keyword in keywords))
+
+
+LIVE_PATTERN = _compile_substring_pattern(TEMPORAL_KEYWORDS + LIVE_TOPICS)
+FUTURE_PATTERN = re.compile("|".join(FUTURE_PATTERNS))
+STUDENT_PATTERN = _compile_substring_pattern(STUDENT_KEYWORDS + STUDENT_OPERATIONS)
+DOMAIN_PATTERN = _compile_substring_pattern(DOMAIN_KEYWORDS)
+
+
+@lru_cache(maxsize=1)
+def _date_keywords_pattern(today: date):
+    """Current year and month keywords, recompiled only when the date changes."""
+    return _compile_substring_pattern(
+        [
+            today.strftime("%Y"),  # Current year
+            today.strftime("%B"),  # Current month
+        ]
+    )
 
 
 def is_live_question(question: str) -> bool:
@@ -11,62 +152,16 @@ def is_live_question(question: str) -> bool:
     """
     question_lower = question.lower()
 
-    # Temporal keywords
-    temporal_keywords = [
-        "today",
-        "now",
-        "current",
-        "latest",
-        "recent",
-        "yesterday",
-        "this week",
-        "this month",
-        "this year",
-        "trending",
-        "breaking",
-        "live",
-        "real-time",
-        datetime.now().strftime("%Y"),  # Current year
-        datetime.now().strftime("%B"),  # Current month
-    ]
-
-    # Topics that typically need live data
-    live_topics = [
-        "news",
-        "weather",
-        "stock",
-        "price",
-        "election",
-        "covid",
-        "pandemic",
-        "sports score",
-        "match result",
-        "currency rate",
-        "exchange rate",
-        "update",
-    ]
-
-    # Check for temporal keywords
-    for keyword in temporal_keywords:
-        if keyword in question_lower:
-            return True
-
-    # Check for live topics
-    for topic in live_topics:
-        if topic in question_lower:
-            return True
+    # Check for temporal keywords and live topics
+    if LIVE_PATTERN.search(question_lower):
+        return True
+
+    if _date_keywords_pattern(date.today()).search(question_lower):
+        return True
 
     # Check for future tense (predictions)
-    future_patterns = [
-        r"\bwill\b",
-        r"\bgoing to\b",
-        r"\bforecast\b",
-        r"\bpredict\b",
-        r"\bexpect\b",
-    ]
-    for pattern in future_patterns:
-        if re.search(pattern, question_lower):
-            return True
+    if FUTURE_PATTERN.search(question_lower):
+        return True
 
     return False
 
@@ -80,64 +175,8 @@ def is_student_question(question: str) -> bool:
     """
     question_lower = question.lower()
 
-    # Keywords that indicate student database queries
-    student_keywords = [
-        "student",
-        "students",
-        "enrollment",
-        "enrolled",
-        "course",
-        "courses",
-        "class",
-        "classes",
-        "grade",
-        "grades",
-        "gpa",
-        "learner",
-        "learners",
-        "pupil",
-        "pupils",
-        "undergraduate",
-        "graduate",
-        "major",
-        "minor",
-    ]
-
-    # Check for student-specific keywords
-    for keyword in student_keywords:
-        if keyword in question_lower:
-            return True
-
-    # Check for operations on student data
-    student_operations = [
-        "add student",
-        "create student",
-        "new student",
-        "register student",
-        "enroll student",
-        "delete student",
-        "remove student",
-        "update student",
-        "modify student",
-        "edit student",
-        "list student",
-        "show student",
-        "find student",
-        "search student",
-        "get student",
-        "how many student",
-        "count student",
-        "average age",
-        "who is enrolled",
-        "who is taking",
-        "who studies",
-    ]
-
-    for operation in student_operations:
-        if operation in question_lower:
-            return True
-
-    return False
+    # Check for student-specific keywords and operations on student data
+    return STUDENT_PATTERN.search(question_lower) is not None
 
 
 def is_domain_question(question: str) -> bool:
@@ -149,44 +188,19 @@ def is_domain_question(question: str) -> bool:
     """
     question_lower = question.lower()
 
-    # Keywords that indicate crime database queries
-    domain_keywords = [
-        "crime",
-        "criminal",
-        "incident",
-        "offense",
-        "arrest",
-        "robbery",
-        "theft",
-        "assault",
-        "burglary",
-        "homicide",
-        "violation",
-        "suspect",
-        "victim",
-        "report",
-        "police",
-        "investigation",
-        "felony",
-        "misdemeanor",
-        "los angeles",
-        # "la" is too short/generic on its own, better to rely on longer context or specific crime terms
-        # "location", "area", "district" are too generic unless combined with crime terms
-    ]
-
-    # Check if question contains domain-specific keywords
-    for keyword in domain_keywords:
-        if keyword in question_lower:
-            return True
-
-    # Check for queries about specific data patterns ONLY if they likely relate to the domain
-    # We remove generic patterns like "how many" or "list" as they apply to anything.
-    # Instead, we can look for "crime" related patterns or just rely on the keywords above.
-
-    # If the user asks specifically about "records" or "stats" WITHOUT a crime keyword,
-    # it's usually general. So we rely heavily on the explicit domain keywords.
+    # Check if question contains domain-specific keywords.
+    # Generic patterns like "how many" or "list" apply to anything, and
+    # "records" or "stats" WITHOUT a crime keyword are usually general, so
+    # we rely heavily on the explicit domain keywords.
+    return DOMAIN_PATTERN.search(question_lower) is not None
 
-    return False
+
+def normalize_question(question: str) -> str:
+    """
+    Canonical form of a question, shared by the classifier memo and the
+    Redis cache key so both layers agree on what counts as a repeat.
+    """
+    return question.strip().lower()
 
 
 def classify_intent(question: str) -> str:
@@ -197,9 +211,18 @@ def classify_intent(question: str) -> str:
     - 'rag': Requires domain-specific data from the crime database
     - 'general': General knowledge question for Ollama
 
+    Results are memoized on the normalized question.
+
     Returns the intent type as a string.
     """
+    # The date is part of the key because the live keywords include the
+    # current year and month
+    return _classify_cached(normalize_question(question), date.today())
+
 
+@lru_cache(maxsize=4096)
+def _classify_cached(question: str, today: date) -> str:
+    """Classify an already-normalized question (see classify_intent)."""
     # Priority 1: Student data questions go to Student API
     if is_student_question(question):
         return "student"
@@ -1,11 +1,18 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
 from vector_store import search_similar
 from config import OLLAMA_URL, MODEL_NAME
 
+# Persistent HTTP session so Ollama calls reuse keep-alive connections
+_ollama_base = "{0.scheme}://{0.netloc}/".format(urlsplit(OLLAMA_URL))
+_session = requests.Session()
+_session.mount(_ollama_base, HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
 
 def query_ollama(prompt):
     """Send a prompt to Ollama and get the response."""
-    response = requests.post(
+    response = _session.post(
         OLLAMA_URL, json={"model": MODEL_NAME, "prompt": prompt, "stream": False}
     )
     return response.json()["response"]
@@ -1,3 +1,28 @@
+import hashlib
+import json
 import redis
+from mcp.intent_classifier import normalize_question
 
 redis_client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
+
+
+def make_cache_key(question: str) -> str:
+    """Compact fixed-size cache key for the normalized question."""
+    normalized = normalize_question(question)
+    return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+
+def get_cached_answer(question: str):
+    """Return the cached (intent, answer) tuple for a question, or None."""
+    cached = redis_client.get(make_cache_key(question))
+    if cached is None:
+        return None
+
+    entry = json.loads(cached)
+    return entry["intent"], entry["answer"]
+
+
+def cache_answer(question: str, intent: str, answer: str, ttl: int):
+    """Cache the intent and answer of a question for `ttl` seconds."""
+    value = json.dumps({"intent": intent, "answer": answer})
+    redis_client.setex(make_cache_key(question), ttl, value)
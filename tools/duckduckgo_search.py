@@ -1,36 +1,52 @@
 from ddgs import DDGS
+from functools import lru_cache
+from config import WEB_SEARCH_CACHE_TTL
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+RESULT_TEMPLATE = "[{0}] {1}\n{2}\nSource: {3}\n"
+
+
+@lru_cache(maxsize=256)
+def _cached_search(query: str, max_results: int, ttl_bucket: int) -> tuple:
+    """
+    Run the DuckDuckGo search and format the results.
+
+    `ttl_bucket` changes every WEB_SEARCH_CACHE_TTL seconds, so repeated
+    lookups are memoized without serving stale live data. Errors are
+    raised rather than returned so they are never cached.
+    """
+    with DDGS() as ddgs:
+        # Format each result with title, body, and URL as it streams in
+        return tuple(
+            RESULT_TEMPLATE.format(
+                idx,
+                r.get("title", "No title"),
+                r.get("body", "No description"),
+                r.get("href", ""),
+            )
+            for idx, r in enumerate(ddgs.text(query, max_results=max_results), 1)
+        )
+
 
 def live_search(query: str, max_results=5):
     """
     Performs live web search using DuckDuckGo.
     Returns formatted search results as a list of strings.
     """
-    results = []
-
     try:
         logger.info(f"Performing DuckDuckGo search for: {query}")
 
-        with DDGS() as ddgs:
-            search_results = list(ddgs.text(query, max_results=max_results))
-
-            if not search_results:
-                logger.warning(f"No results found for query: {query}")
-                return ["No web results found for your query."]
-
-            for idx, r in enumerate(search_results, 1):
-                # Format each result with title, body, and URL
-                title = r.get("title", "No title")
-                body = r.get("body", "No description")
-                url = r.get("href", "")
+        ttl_bucket = int(time.time() // WEB_SEARCH_CACHE_TTL)
+        results = list(_cached_search(query, max_results, ttl_bucket))
 
-                formatted_result = f"[{idx}] {title}\n{body}\nSource: {url}\n"
-                results.append(formatted_result)
+        if not results:
+            logger.warning(f"No results found for query: {query}")
+            return ["No web results found for your query."]
 
-            logger.info(f"Found {len(results)} results")
+        logger.info(f"Found {len(results)} results")
 
     except Exception as e:
         logger.error(f"DuckDuckGo search failed: {e}")
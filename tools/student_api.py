@@ -5,13 +5,47 @@ Provides CRUD operations and natural language query capabilities
 for the Student PostgreSQL database.
 """
 
+import json
 import logging
-from typing import List, Dict, Optional, Any
-from db import DatabaseConnection
+import re
+import threading
+import time
+from functools import lru_cache
+from string import Template
+from typing import List, Dict, Optional, Any, Tuple
+from cachetools import LRUCache
+from psycopg2.extras import execute_values
+from db import (
+    DatabaseConnection,
+    RealDictCursor,
+    execute_prepared,
+    register_prepared_statement,
+)
 from rag import query_ollama
 
 logger = logging.getLogger(__name__)
 
+# Read-hot lookups run as server-side prepared statements
+register_prepared_statement(
+    "stu_by_id",
+    "SELECT user_id, name, age, course FROM students WHERE user_id = $1",
+    param_types=("integer",),
+)
+register_prepared_statement(
+    "stu_search",
+    "SELECT user_id, name, age, course FROM students "
+    "WHERE LOWER(name) LIKE LOWER($1) ORDER BY name",
+    param_types=("text",),
+)
+register_prepared_statement("stu_count", "SELECT COUNT(*) FROM students")
+# Course statistics are aggregated into a single JSON array server-side
+register_prepared_statement(
+    "stu_course_stats",
+    "SELECT json_agg(t) FROM ("
+    "SELECT course, COUNT(*) AS student_count, AVG(age) AS avg_age "
+    "FROM students GROUP BY course ORDER BY student_count DESC) t",
+)
+
 
 # ========================================
 # CRUD Operations
@@ -37,12 +71,9 @@ def get_all_students(limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
     """
 
     try:
-        with DatabaseConnection() as cursor:
+        with DatabaseConnection(cursor_factory=RealDictCursor) as cursor:
             cursor.execute(query, (limit, offset))
-            columns = [desc[0] for desc in cursor.description]
-            results = cursor.fetchall()
-
-            students = [dict(zip(columns, row)) for row in results]
+            students = cursor.fetchall()
             logger.info(f"✅ Retrieved {len(students)} students")
             return students
     except Exception as e:
@@ -60,20 +91,12 @@ def get_student_by_id(student_id: int) -> Optional[Dict[str, Any]]:
     Returns:
         Student dictionary or None if not found
     """
-    query = """
-    SELECT user_id, name, age, course 
-    FROM students 
-    WHERE user_id = %s;
-    """
-
     try:
-        with DatabaseConnection() as cursor:
-            cursor.execute(query, (student_id,))
-            result = cursor.fetchone()
+        with DatabaseConnection(cursor_factory=RealDictCursor) as cursor:
+            execute_prepared(cursor, "stu_by_id", (student_id,))
+            student = cursor.fetchone()
 
-            if result:
-                columns = [desc[0] for desc in cursor.description]
-                student = dict(zip(columns, result))
+            if student:
                 logger.info(f"✅ Retrieved student ID {student_id}")
                 return student
             else:
@@ -94,20 +117,10 @@ def search_students(name: str) -> List[Dict[str, Any]]:
     Returns:
         List of matching student dictionaries
     """
-    query = """
-    SELECT user_id, name, age, course 
-    FROM students 
-    WHERE LOWER(name) LIKE LOWER(%s)
-    ORDER BY name;
-    """
-
     try:
-        with DatabaseConnection() as cursor:
-            cursor.execute(query, (f"%{name}%",))
-            columns = [desc[0] for desc in cursor.description]
-            results = cursor.fetchall()
-
-            students = [dict(zip(columns, row)) for row in results]
+        with DatabaseConnection(cursor_factory=RealDictCursor) as cursor:
+            execute_prepared(cursor, "stu_search", (f"%{name}%",))
+            students = cursor.fetchall()
             logger.info(f"✅ Found {len(students)} students matching '{name}'")
             return students
     except Exception as e:
@@ -133,12 +146,9 @@ def get_students_by_course(course: str) -> List[Dict[str, Any]]:
     """
 
     try:
-        with DatabaseConnection() as cursor:
+        with DatabaseConnection(cursor_factory=RealDictCursor) as cursor:
             cursor.execute(query, (f"%{course}%",))
-            columns = [desc[0] for desc in cursor.description]
-            results = cursor.fetchall()
-
-            students = [dict(zip(columns, row)) for row in results]
+            students = cursor.fetchall()
             logger.info(f"✅ Found {len(students)} students in course '{course}'")
             return students
     except Exception as e:
@@ -179,6 +189,33 @@ def add_student(
         return None
 
 
+def add_students(students: List[Tuple[str, int, str]]) -> List[int]:
+    """
+    Add many students in bulk, 500 rows per round trip.
+
+    Args:
+        students: (name, age, course) tuples
+
+    Returns:
+        New student IDs in insertion order, or an empty list if failed
+    """
+    query = """
+    INSERT INTO students (name, age, course)
+    VALUES %s
+    RETURNING user_id;
+    """
+
+    try:
+        with DatabaseConnection() as cursor:
+            rows = execute_values(cursor, query, students, page_size=500, fetch=True)
+            student_ids = [row[0] for row in rows]
+            logger.info(f"✅ Added {len(student_ids)} new students")
+            return student_ids
+    except Exception as e:
+        logger.error(f"❌ Error adding students: {e}")
+        return []
+
+
 def update_student(student_id: int, **kwargs) -> bool:
     """
     Update student information.
@@ -254,9 +291,33 @@ def delete_student(student_id: int) -> bool:
 # ========================================
 
 
+def is_select_query(sql_query: str) -> bool:
+    """
+    Check that an (LLM-generated) query is a single SELECT statement.
+
+    Any semicolon before the trailing one is rejected, even inside a
+    string literal, comment or quoted identifier, since telling those
+    apart safely needs a full SQL tokenizer.
+
+    Args:
+        sql_query: SQL query to check
+
+    Returns:
+        True if the query is a single SELECT (or WITH ... SELECT) statement
+    """
+    statement = sql_query.strip().rstrip(";").strip()
+
+    # Reject stacked statements such as "SELECT ...; DROP TABLE ..."
+    if not statement or ";" in statement:
+        return False
+
+    first_word = statement.split(None, 1)[0].upper()
+    return first_word in ("SELECT", "WITH")
+
+
 def execute_sql_query(sql_query: str) -> str:
     """
-    Execute a SQL query and return formatted results.
+    Execute a read-only SQL query and return formatted results.
 
     Args:
         sql_query: SQL query to execute
@@ -264,33 +325,258 @@ def execute_sql_query(sql_query: str) -> str:
     Returns:
         Formatted string with query results
     """
+    if not is_select_query(sql_query):
+        logger.warning(f"⚠️  Rejected non-SELECT query: {sql_query}")
+        return "Error executing query: only single SELECT queries are allowed."
+
     try:
-        with DatabaseConnection() as cursor:
+        with DatabaseConnection(readonly=True) as cursor:
             cursor.execute(sql_query)
+            columns = [desc[0] for desc in cursor.description]
+            results = cursor.fetchall()
 
-            # Check if it's a SELECT query
-            if sql_query.strip().upper().startswith("SELECT"):
-                columns = [desc[0] for desc in cursor.description]
-                results = cursor.fetchall()
-
-                if not results:
-                    return "No results found."
+            if not results:
+                return "No results found."
 
-                # Format results as a readable string
-                formatted_results = []
-                for row in results:
-                    row_dict = dict(zip(columns, row))
-                    formatted_results.append(str(row_dict))
+            # Format results as a readable string
+            formatted_results = []
+            for row in results:
+                row_dict = dict(zip(columns, row))
+                formatted_results.append(str(row_dict))
 
-                return "\n".join(formatted_results)
-            else:
-                return f"Query executed successfully. Rows affected: {cursor.rowcount}"
+            return "\n".join(formatted_results)
 
     except Exception as e:
         logger.error(f"❌ SQL execution error: {e}")
         return f"Error executing query: {str(e)}"
 
 
+def fetch_sql_rows(
+    sql_query: str, params: Optional[List[Any]] = None
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Execute a read-only SELECT query and return its rows as dictionaries.
+
+    Args:
+        sql_query: SQL query to execute
+        params: Bind parameters for %s placeholders in the query
+
+    Returns:
+        List of row dictionaries or None if the query failed or was rejected
+    """
+    if not is_select_query(sql_query):
+        logger.warning(f"⚠️  Rejected non-SELECT query: {sql_query}")
+        return None
+
+    try:
+        with DatabaseConnection(cursor_factory=RealDictCursor, readonly=True) as cursor:
+            cursor.execute(sql_query, params)
+            return cursor.fetchall()
+    except Exception as e:
+        logger.error(f"❌ SQL execution error: {e}")
+        return None
+
+
+def render_answer(answer_template: str, rows: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Render the LLM-provided answer template once per result row.
+
+    Every placeholder must name a selected column; a template that refers
+    to anything else (e.g. $count for a column aliased "total") is rejected
+    rather than shown to the user half-filled.
+
+    Args:
+        answer_template: Sentence with $column placeholders
+        rows: Query result rows
+
+    Returns:
+        Formatted answer, or None if the template does not fit the rows
+    """
+    if not rows:
+        return "No results found."
+
+    template = Template(answer_template)
+    try:
+        return "\n".join(template.substitute(row) for row in rows)
+    except (KeyError, ValueError) as e:
+        logger.warning(f"⚠️  Answer template does not match the result: {e}")
+        return None
+
+
+def _clean_sql(sql_query: str) -> str:
+    """Strip markdown code fences and a leading "sql" tag from LLM output."""
+    sql_query = sql_query.strip()
+
+    # Clean up the response (remove markdown code blocks if present)
+    if sql_query.startswith("```"):
+        lines = sql_query.split("\n")
+        sql_query = "\n".join([line for line in lines if not line.startswith("```")])
+        sql_query = sql_query.strip()
+
+    # Remove "sql" or "SQL" prefix if present
+    if sql_query.lower().startswith("sql"):
+        sql_query = sql_query[3:].strip()
+
+    return sql_query
+
+
+def _parse_sql_plan(response: str) -> Optional[Dict[str, str]]:
+    """
+    Parse the {"sql": ..., "answer_template": ...} JSON returned by the LLM.
+
+    Returns:
+        Dictionary with "sql" and optional "answer_template", or None if
+        the response is not valid JSON
+    """
+    start, end = response.find("{"), response.rfind("}")
+    if start == -1 or end <= start:
+        return None
+
+    try:
+        plan = json.loads(response[start : end + 1])
+    except json.JSONDecodeError:
+        return None
+
+    if not isinstance(plan, dict) or not isinstance(plan.get("sql"), str):
+        return None
+    return plan
+
+
+# ========================================
+# SQL Template Cache
+# ========================================
+
+# Quoted strings and bare numbers in a question are its literals
+_QUESTION_LITERAL = re.compile(r'"([^"]+)"|\b(\d+)\b')
+
+# Single-quoted SQL string literals ('' is an escaped quote)
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+
+# Question shape -> (SQL template, parameter specs, answer template)
+_sql_template_cache = LRUCache(maxsize=512)
+_sql_template_lock = threading.Lock()
+
+
+def question_shape(question: str) -> Tuple[str, List[str]]:
+    """
+    Split a question into its shape and its literals.
+
+    "students older than 20" and "students older than 25" share the shape
+    "students older than ?", so they can reuse the same generated SQL.
+
+    Returns:
+        (shape, literals) tuple
+    """
+    literals = []
+
+    def replace(match):
+        literals.append(match.group(1) or match.group(2))
+        return "?"
+
+    shape = _QUESTION_LITERAL.sub(replace, question).strip().lower()
+    return shape, literals
+
+
+def _find_literal_span(sql_query: str, literal: str):
+    """Locate the single SQL token holding `literal`, or None if ambiguous."""
+    strings = [m.span() for m in _SQL_STRING.finditer(sql_query)]
+
+    if literal.isdigit():
+        spans = [
+            (m.start(), m.end(), "", "")
+            for m in re.finditer(rf"\b{literal}\b", sql_query)
+            if not any(start <= m.start() < end for start, end in strings)
+        ]
+    else:
+        spans = []
+        for start, end in strings:
+            content = sql_query[start + 1 : end - 1]
+            pos = content.lower().find(literal.lower())
+            if pos != -1 and content.lower().count(literal.lower()) == 1:
+                prefix, suffix = content[:pos], content[pos + len(literal) :]
+                spans.append((start, end, prefix, suffix))
+
+    return spans[0] if len(spans) == 1 else None
+
+
+def _make_sql_template(sql_query: str, literals: List[str]):
+    """
+    Turn generated SQL into a parameterized template for its question shape.
+
+    Each question literal must appear exactly once in the SQL; it is
+    replaced by a %s placeholder so new literals can be bound on reuse.
+
+    Returns:
+        (SQL template, [(literal index, prefix, suffix, is_number)]) or
+        None if the literals cannot be mapped unambiguously
+    """
+    spans = []
+    for literal_index, literal in enumerate(literals):
+        span = _find_literal_span(sql_query, literal)
+        if span is None:
+            return None
+        spans.append((*span, literal_index, literal.isdigit()))
+
+    spans.sort()
+    if any(a[1] > b[0] for a, b in zip(spans, spans[1:])):
+        return None
+
+    pieces, param_specs, cursor_pos = [], [], 0
+    for start, end, prefix, suffix, literal_index, is_number in spans:
+        pieces.append(sql_query[cursor_pos:start].replace("%", "%%"))
+        pieces.append("%s")
+        param_specs.append((literal_index, prefix, suffix, is_number))
+        cursor_pos = end
+    pieces.append(sql_query[cursor_pos:].replace("%", "%%"))
+
+    return "".join(pieces), param_specs
+
+
+def _bind_literals(param_specs, literals: List[str]) -> List[Any]:
+    """Build the bind parameters of a cached SQL template."""
+    params = []
+    for literal_index, prefix, suffix, is_number in param_specs:
+        literal = literals[literal_index]
+        params.append(int(literal) if is_number else f"{prefix}{literal}{suffix}")
+    return params
+
+
+def _cached_answer(question: str) -> Optional[str]:
+    """Answer a question from the SQL template cache, or None on a miss."""
+    shape, literals = question_shape(question)
+    with _sql_template_lock:
+        entry = _sql_template_cache.get(shape)
+    if entry is None:
+        return None
+
+    sql_template, param_specs, answer_template = entry
+    rows = fetch_sql_rows(sql_template, _bind_literals(param_specs, literals))
+    if rows is None:
+        return None
+
+    answer = render_answer(answer_template, rows)
+    if answer is None:
+        # Never serve a broken template twice; the LLM gets asked again
+        with _sql_template_lock:
+            _sql_template_cache.pop(shape, None)
+        return None
+
+    logger.info(f"SQL template cache HIT: {shape}")
+    return answer
+
+
+def _cache_sql_template(question: str, sql_query: str, answer_template: str):
+    """Remember the generated SQL for the question's shape."""
+    shape, literals = question_shape(question)
+    template = _make_sql_template(sql_query, literals)
+    if template is None:
+        return
+
+    sql_template, param_specs = template
+    with _sql_template_lock:
+        _sql_template_cache[shape] = (sql_template, param_specs, answer_template)
+
+
 def query_students_natural(question: str) -> str:
     """
     Answer natural language questions about students using the database.
@@ -298,12 +584,24 @@ def query_students_natural(question: str) -> str:
     This is the main entry point for the Student API tool in the hybrid agent.
     It converts natural language questions to SQL queries and returns formatted answers.
 
+    A single LLM call returns both the SQL and an answer template, so the
+    results are formatted in Python without a second round-trip. If the
+    LLM does not follow the JSON format, the results are formatted by a
+    second LLM call instead.
+
+    Questions with the same shape as an earlier one (differing only in
+    numbers or quoted strings) reuse its SQL and skip the LLM entirely.
+
     Args:
         question: Natural language question about students
 
     Returns:
         Formatted answer based on database query
     """
+    cached = _cached_answer(question)
+    if cached is not None:
+        return cached
+
     # First, get some sample data to help the LLM understand the schema
     schema_info = """
     Database Schema:
@@ -315,42 +613,47 @@ def query_students_natural(question: str) -> str:
     - course (VARCHAR)
     """
 
-    # Use LLM to convert natural language to SQL
+    # Use LLM to convert natural language to SQL plus an answer template
     prompt = f"""You are a SQL expert. Convert the following natural language question into a PostgreSQL query.
 
 {schema_info}
 
 Rules:
-1. Return ONLY the SQL query, nothing else
+1. Return ONLY a JSON object with the keys "sql" and "answer_template", nothing else
 2. Use proper PostgreSQL syntax
-3. For counting, use COUNT(*)
+3. For counting, use COUNT(*) with a column alias, e.g. COUNT(*) AS total
 4. For filtering by course, use ILIKE for case-insensitive matching
 5. Always use safe queries (SELECT only, no DELETE/DROP/etc.)
 6. If asking for "students", select: user_id, name, age, course
+7. "answer_template" is one sentence describing ONE result row, using $column
+   placeholders for the selected columns, e.g. "$name is $age years old and studies $course."
+   Do not answer the question yet.
 
 Question: {question}
 
-SQL Query:"""
+JSON:"""
 
     try:
-        # Get SQL query from LLM
-        sql_query = query_ollama(prompt).strip()
-
-        # Clean up the response (remove markdown code blocks if present)
-        if sql_query.startswith("```"):
-            lines = sql_query.split("\n")
-            sql_query = "\n".join(
-                [line for line in lines if not line.startswith("```")]
-            )
-            sql_query = sql_query.strip()
-
-        # Remove "sql" or "SQL" prefix if present
-        if sql_query.lower().startswith("sql"):
-            sql_query = sql_query[3:].strip()
+        # Get SQL query and answer template from LLM
+        response = query_ollama(prompt).strip()
+        plan = _parse_sql_plan(response)
 
+        sql_query = _clean_sql(plan["sql"] if plan else response)
         logger.info(f"Generated SQL: {sql_query}")
 
-        # Execute the query
+        # Execute the query and format it with the template when we have one
+        answer_template = plan.get("answer_template") if plan else None
+        if answer_template:
+            rows = fetch_sql_rows(sql_query)
+            if rows == []:
+                return "No results found."
+            if rows:
+                answer = render_answer(answer_template, rows)
+                if answer is not None:
+                    # Only templates proven against real rows are cached
+                    _cache_sql_template(question, sql_query, answer_template)
+                    return answer
+
         raw_results = execute_sql_query(sql_query)
 
         # Use LLM to format the results into a natural language answer
@@ -376,40 +679,62 @@ Provide a concise, helpful answer:"""
 # ========================================
 
 
-def get_students_count() -> int:
-    """Get total number of students in the database."""
-    query = "SELECT COUNT(*) FROM students;"
+# Student counts are polled often and change rarely; serve them from an
+# in-process cache that refreshes every COUNT_CACHE_TTL seconds
+COUNT_CACHE_TTL = 5
+
+
+@lru_cache(maxsize=1)
+def _count_cached(bucket: int) -> int:
+    """Count students once per time bucket (errors are not cached)."""
+    # COUNT(*) is already the fastest form in PostgreSQL; COUNT(1) would only
+    # add a per-row argument check
+    with DatabaseConnection() as cursor:
+        execute_prepared(cursor, "stu_count")
+        return cursor.fetchone()[0]
 
+
+def get_students_count() -> int:
+    """Get total number of students in the database (cached for a few seconds)."""
     try:
-        with DatabaseConnection() as cursor:
-            cursor.execute(query)
-            count = cursor.fetchone()[0]
-            return count
+        return _count_cached(int(time.time()) // COUNT_CACHE_TTL)
     except Exception as e:
         logger.error(f"❌ Error counting students: {e}")
         return 0
 
 
-def get_course_statistics() -> Dict[str, Any]:
-    """Get statistics about course enrollment."""
-    query = """
-    SELECT 
-        course, 
-        COUNT(*) as student_count, 
-        AVG(age) as avg_age
-    FROM students 
-    GROUP BY course 
-    ORDER BY student_count DESC;
+def get_students_count_estimate() -> int:
+    """
+    Get an O(1) estimate of the student count from PostgreSQL's statistics.
+
+    The estimate is refreshed by VACUUM/ANALYZE, so it can lag recent
+    writes. Falls back to the exact count if the table was never analyzed.
+
+    Returns:
+        Approximate number of students
     """
+    query = "SELECT reltuples::bigint FROM pg_class WHERE oid = 'students'::regclass;"
 
     try:
         with DatabaseConnection() as cursor:
             cursor.execute(query)
-            columns = [desc[0] for desc in cursor.description]
-            results = cursor.fetchall()
+            estimate = cursor.fetchone()[0]
+    except Exception as e:
+        logger.error(f"❌ Error estimating student count: {e}")
+        return 0
+
+    if estimate < 0:
+        return get_students_count()
+    return estimate
 
-            stats = [dict(zip(columns, row)) for row in results]
-            return {"courses": stats}
+
+def get_course_statistics() -> Dict[str, Any]:
+    """Get statistics about course enrollment."""
+    try:
+        with DatabaseConnection() as cursor:
+            execute_prepared(cursor, "stu_course_stats")
+            # psycopg2 decodes the json_agg array; NULL means no courses
+            return {"courses": cursor.fetchone()[0] or []}
     except Exception as e:
         logger.error(f"❌ Error fetching course statistics: {e}")
         return {"courses": []}
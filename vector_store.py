@@ -1,29 +1,255 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import List
 import faiss
 import pickle
+import pyarrow as pa
+import pyarrow.feather as feather
 from embeddings import generate_embeddings
-from config import INDEX_FILE
+from config import (
+    INDEX_FILE,
+    TEXTS_FILE,
+    LEGACY_TEXTS_FILE,
+    HNSW_EF_SEARCH,
+    IVF_NPROBE,
+    SEARCH_BATCH_WINDOW_MS,
+    FAISS_USE_GPU,
+    FAISS_GPU_SHARD,
+    GPU_MAX_TOP_K,
+    FAISS_NUM_THREADS,
+)
 
-# Load the pre-built FAISS index
-try:
-    index = faiss.read_index(INDEX_FILE)
-    with open("crime_texts.pkl", "rb") as f:
-        texts = pickle.load(f)
+# GPU resources are allocated once per device and shared by every GPU index
+_gpu_resources = {}
+
+
+def get_gpu_resources(device=0):
+    """Return the process-wide StandardGpuResources for a GPU."""
+    if device not in _gpu_resources:
+        _gpu_resources[device] = faiss.StandardGpuResources()
+    return _gpu_resources[device]
+
+
+def move_index_to_gpu(cpu_index):
+    """
+    Clone the index onto the GPU(s) when faiss-gpu and a GPU are available.
+
+    Opt out with FAISS_USE_GPU=0. With several GPUs each one holds a full
+    replica, so a batch is served by a single GPU (FAISS_GPU_SHARD=1 splits
+    the index across them instead, for indexes too large for one). Vectors are stored in float16 on the GPU to halve
+    memory use. Index types without a GPU implementation (e.g. HNSW) stay
+    on the CPU.
+
+    The GPU mainly pays off for batched searches; a single query is
+    dominated by host/device transfers.
+
+    Returns:
+        (index, on_gpu) tuple
+    """
+    if not FAISS_USE_GPU or not hasattr(faiss, "StandardGpuResources"):
+        return cpu_index, False
+
+    num_gpus = faiss.get_num_gpus()
+    if num_gpus == 0:
+        return cpu_index, False
+
+    try:
+        if num_gpus > 1:
+            options = faiss.GpuMultipleClonerOptions()
+            options.useFloat16 = True
+            options.shard = FAISS_GPU_SHARD
+            gpus = list(range(num_gpus))
+            gpu_index = faiss.index_cpu_to_gpu_multiple_py(
+                [get_gpu_resources(gpu) for gpu in gpus], cpu_index, options, gpus
+            )
+        else:
+            options = faiss.GpuClonerOptions()
+            options.useFloat16 = True
+            gpu_index = faiss.index_cpu_to_gpu(
+                get_gpu_resources(), 0, cpu_index, options
+            )
+        print(f"[OK] Moved FAISS index to {num_gpus} GPU(s)")
+        return gpu_index, True
+    except RuntimeError as e:
+        print(f"[INFO] Keeping FAISS index on CPU: {e}")
+        return cpu_index, False
+
+
+def load_texts():
+    """
+    Load the record texts as a memory-mapped Arrow column.
+
+    Only the rows returned by a search are paged in. Falls back to the
+    pickle written by older versions of build_index.py.
+    """
+    if os.path.exists(TEXTS_FILE):
+        table = feather.read_table(TEXTS_FILE, memory_map=True)
+        return table.column("text")
+
+    with open(LEGACY_TEXTS_FILE, "rb") as f:
+        print(f"[INFO] {TEXTS_FILE} not found, loading {LEGACY_TEXTS_FILE}")
+        return pa.chunked_array([pa.array(pickle.load(f), type=pa.string())])
+
+
+@lru_cache(maxsize=1)
+def get_index_and_texts():
+    """
+    Load the pre-built FAISS index and record texts once, on first search.
+
+    Nothing is read at import time. The index is opened with IO_FLAG_MMAP,
+    which only maps the inverted lists of the IVF types; HNSW and flat
+    indexes are still read fully into memory. The texts are memory-mapped
+    from the Feather file.
+
+    Returns:
+        (index, texts, on_gpu) tuple
+    """
+    try:
+        index = faiss.read_index(
+            INDEX_FILE, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        )
+        texts = load_texts()
+    except FileNotFoundError:
+        print("[ERROR] Index files not found!")
+        print("[INFO] Please run: python build_index.py")
+        raise
     print(f"[OK] Loaded FAISS index with {index.ntotal} vectors")
-except FileNotFoundError:
-    print("[ERROR] Index files not found!")
-    print("[INFO] Please run: python build_index.py")
-    raise
+
+    # Search-time accuracy/speed knobs for approximate indexes
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif (ivf := faiss.try_extract_index_ivf(index)) is not None:
+        # Also reaches the IVF index behind a pre-transform (OPQ)
+        ivf.nprobe = IVF_NPROBE
+
+    index, on_gpu = move_index_to_gpu(index)
+    return index, texts, on_gpu
+
+
+def search_similar_batch(queries: List[str], top_k=3) -> List[List[dict]]:
+    """
+    Search for similar crime records for many queries at once.
+
+    All queries are embedded in one forward pass and stacked into a single
+    (B, d) matrix for one index.search call. Returns one result list per
+    query, in the same format as search_similar.
+    """
+    if not queries:
+        return []
+
+    index, texts, on_gpu = get_index_and_texts()
+    if on_gpu:
+        # GPU indexes cannot return more than GPU_MAX_TOP_K neighbours
+        top_k = min(top_k, GPU_MAX_TOP_K)
+
+    # Already C-contiguous float32, so FAISS searches it without a copy
+    query_embeddings = generate_embeddings(queries)
+    faiss.normalize_L2(query_embeddings)
+
+    # The OpenMP thread count applies to the calling thread only; a single
+    # query is too little work to amortize spinning up a thread team
+    faiss.omp_set_num_threads(1 if len(queries) == 1 else FAISS_NUM_THREADS)
+    distances, indices = index.search(query_embeddings, top_k)
+
+    # Convert whole rows to Python scalars at once; approximate indexes pad
+    # with -1 when fewer than top_k hits are found
+    id_rows = indices.tolist()
+    hit_ids = [idx for row in id_rows for idx in row if idx >= 0]
+
+    # Gather the texts of every hit in the batch with one Arrow take, then
+    # hand them out in the same row-major order. The explicit type keeps an
+    # all-miss batch (empty list -> null array) valid for take.
+    hit_texts = iter(texts.take(pa.array(hit_ids, type=pa.int64())).to_pylist())
+    return [
+        [
+            {"text": next(hit_texts), "distance": dist, "rank": rank}
+            for rank, (idx, dist) in enumerate(zip(id_row, dist_row), start=1)
+            if idx >= 0
+        ]
+        for id_row, dist_row in zip(id_rows, distances.tolist())
+    ]
+
+
+def warm_up():
+    """
+    Load the index and embedding model and run one throwaway search.
+
+    Pays the first-call costs up front so the first real query runs at
+    steady-state latency. Failures are reported but not raised.
+    """
+    try:
+        search_similar_batch(["warmup"], top_k=1)
+        print("[OK] Vector store warmed up")
+    except Exception as e:
+        print(f"[INFO] Vector store warm-up skipped: {e}")
+
+
+class SearchBatcher:
+    """
+    Micro-batcher for concurrent searches.
+
+    Queries arriving within `window` seconds of each other are stacked
+    into one (B, d) matrix and searched together, so the index is scanned
+    once per batch instead of once per query.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def search(self, query, top_k):
+        """Queue a query and block until its batch has been searched."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((query, top_k, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            queries = [query for query, _, _ in batch]
+            try:
+                # Search with the largest top_k and trim per request
+                all_results = search_similar_batch(queries, max(k for _, k, _ in batch))
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, top_k, future), results in zip(batch, all_results):
+                future.set_result(results[:top_k])
+
+
+_batcher = SearchBatcher(SEARCH_BATCH_WINDOW_MS / 1000)
 
 
 def search_similar(query, top_k=3):
-    """Search for similar crime records based on the query."""
-    query_embedding = generate_embeddings([query])
-    distances, indices = index.search(query_embedding, top_k)
-
-    results = []
-    for i, idx in enumerate(indices[0]):
-        results.append(
-            {"text": texts[idx], "distance": float(distances[0][i]), "rank": i + 1}
-        )
+    """
+    Search for similar crime records based on the query.
 
-    return results
+    The query is L2-normalized like the indexed vectors. For inner-product
+    indexes "distance" is the cosine similarity (higher is closer).
+    Concurrent calls are batched together when SEARCH_BATCH_WINDOW_MS > 0.
+    """
+    if SEARCH_BATCH_WINDOW_MS > 0:
+        return _batcher.search(query, top_k)
+    return search_similar_batch([query], top_k)[0]